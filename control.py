@@ -3,14 +3,20 @@
 import views # new report classes
 from model import Student, Parent, Teacher, Term, GP_Group, \
   Grading_Period, Course, Section, Grade_Record, Attendance, \
-    Grading_Standard, Account, canvas_site, Session, crm_site
+    Grading_Standard, Account, canvas_site, Session, crm_site, canvas_site_async, sync_step, Archived_Term, migrate
+from sqlalchemy import select
 
 from time import ctime # for keeping track of times
+from contextlib import nullcontext # stands in for the async client when it isn't used
 
 import pandas # export list of students?
 
+# each function below is a sync_run: the changes it makes share a run id in the change_log
 
-def cs_db_rebuild(*,canvas=None,term=None,student_id_limit = 'C00',course_id_limit = '2020CS', cumulative = False,midterm=False,final=False,comments=True):
+@sync_step
+def cs_db_rebuild(*,canvas=None,term=None,student_id_limit = 'C00',course_id_limit = '2020CS', cumulative = False,midterm=False,final=False,comments=True,workers=None,client='sync'):
+  # client='async' pulls from canvas with canvas_site_async instead of the threaded canvas_site
+  # client='report' loads courses, enrollments and grades from account reports instead of course by course
   if not canvas:
     canvas = canvas_site()
   # can't define term until it exist in db
@@ -18,26 +24,50 @@ def cs_db_rebuild(*,canvas=None,term=None,student_id_limit = 'C00',course_id_lim
   
   if not term:
     term = canvas.get_current_term()
-  
-  print(f'@ {ctime()} Updating students')
-  canvas.pull_student_canvas_ids(id_limit = student_id_limit)
-  
-  print(f'@ {ctime()} Updating teachers')
-  canvas.update_teachers()
 
-  print(f'@ {ctime()} Updating courses for term {term.term_name}')
-  canvas.update_courses(term=term)
+  if client == 'async':
+    with canvas_site_async(canvas) as canvas_async:
+      print(f'@ {ctime()} Updating students')
+      canvas_async.run(canvas_async.pull_student_canvas_ids, id_limit = student_id_limit)
 
-  print(f'@ {ctime()} Updating student enrollments')
-  term.update_enrollments(teachers=False,id_limit=course_id_limit)
+      print(f'@ {ctime()} Updating teachers')
+      canvas_async.run(canvas_async.update_teachers)
 
-  print(f'@ {ctime()} Updating teacher enrollments')
-  term.update_enrollments(students=False,id_limit=course_id_limit)
+      print(f'@ {ctime()} Updating courses for term {term.term_name}')
+      canvas_async.run(canvas_async.update_courses, term=term)
+
+      print(f'@ {ctime()} Updating student and teacher enrollments')
+      canvas_async.run(canvas_async.update_enrollments, term, id_limit=course_id_limit)
+  elif client == 'report':
+    print(f'@ {ctime()} Updating students')
+    canvas.pull_student_canvas_ids(id_limit = student_id_limit)
+
+    print(f'@ {ctime()} Updating teachers')
+    canvas.update_teachers()
+
+    print(f'@ {ctime()} Updating courses and enrollments for term {term.term_name} from the provisioning report')
+    canvas.update_rosters(term=term,id_limit=course_id_limit)
+  else:
+    print(f'@ {ctime()} Updating students')
+    canvas.pull_student_canvas_ids(id_limit = student_id_limit)
+    
+    print(f'@ {ctime()} Updating teachers')
+    canvas.update_teachers()
+
+    print(f'@ {ctime()} Updating courses for term {term.term_name}')
+    canvas.update_courses(term=term)
+
+    print(f'@ {ctime()} Updating student enrollments')
+    term.update_enrollments(teachers=False,id_limit=course_id_limit,site=canvas,workers=workers)
+
+    print(f'@ {ctime()} Updating teacher enrollments')
+    term.update_enrollments(students=False,id_limit=course_id_limit,site=canvas,workers=workers)
 
   print(f'@ {ctime()} Updating period grades')
 
-  db_update_period_records(site=canvas,midterm=midterm,cumulative=cumulative,comments=comments,final=final,course_id_limit=course_id_limit)
+  db_update_period_records(site=canvas,midterm=midterm,cumulative=cumulative,comments=comments,final=final,course_id_limit=course_id_limit,workers=workers,client=client)
 
+@sync_step
 def db_full_rebuild(*,canvas = None, crm = None,term = None, update_canvas = False):
   # recreates full db
   if not canvas:
@@ -63,35 +93,47 @@ def db_full_rebuild(*,canvas = None, crm = None,term = None, update_canvas = Fal
   canvas.update_courses(term=term)
 
   print(f'@ {ctime()} Updating student enrollments')
-  term.update_enrollments(teachers=False)
+  term.update_enrollments(teachers=False,site=canvas)
 
   print(f'@ {ctime()} Updating teacher enrollments')
-  term.update_enrollments(students=False)
+  term.update_enrollments(students=False,site=canvas)
 
-def db_initialize(site = None,crm=None):
+@sync_step
+def db_initialize(site = None,crm=None,refresh=False):
   # creates basic db without student, course, and teacher info
+  # unchanged canvas data is skipped using the http cache; refresh=True merges everything again
+  print(f'@ {ctime()} Creating and upgrading db tables')
+  migrate()
+
   if not site:
     site = canvas_site()
   if not crm:
     crm = crm_site()
   
   print(f'@ {ctime()} Updating accounts/subaccounts')
-  site.update_accounts()
+  site.update_accounts(refresh=refresh)
 
   print(f'@ {ctime()} Updating terms')
-  site.update_terms()
+  site.update_terms(refresh=refresh)
   
   print(f'@ {ctime()} Updating grading periods')
-  site.update_grading_periods()
+  site.update_grading_periods(refresh=refresh)
 
   print(f'@ {ctime()} Updating grading standards')
-  site.update_grading_standards()
+  site.update_grading_standards(refresh=refresh)
 
   print(f'@ {ctime()} Updating CRM field info')
   crm.update_custom()
 
   print(f'Finished basic initilization at {ctime()}')
 
+@sync_step
+def db_upgrade():
+  # creates any new tables and applies pending migrations to an existing db, e.g. after updating the code
+  # db_initialize does this too; run this first when going straight to an update
+  migrate()
+
+@sync_step
 def db_update_people(*,site = None,crm = None,crm_lookup = False):
   if not site:
     site = canvas_site()
@@ -111,6 +153,7 @@ def db_update_people(*,site = None,crm = None,crm_lookup = False):
 
   print(f'Finished updating people at {ctime()}')
 
+@sync_step
 def db_update_courses(site = None,*,term = None):
   if not site:
     site = canvas_site()
@@ -121,21 +164,33 @@ def db_update_courses(site = None,*,term = None):
   site.update_courses(term=term)
 
 
-def db_update_enrollments(site = None,*,term = None):
+@sync_step
+def db_update_enrollments(site = None,*,term = None, workers = None, client = 'sync'):
   if not site:
     site = canvas_site()
   if not term:
     term = site.get_current_term()
   
-  print(f'@ {ctime()} Updating student enrollments')
-  term.update_enrollments(teachers=False)
+  if client == 'async':
+    print(f'@ {ctime()} Updating student and teacher enrollments')
+    with canvas_site_async(site) as canvas_async:
+      canvas_async.run(canvas_async.update_enrollments, term)
+  elif client == 'report':
+    print(f'@ {ctime()} Updating student and teacher enrollments from the provisioning report')
+    site.update_rosters(term=term)
+  else:
+    print(f'@ {ctime()} Updating student enrollments')
+    term.update_enrollments(teachers=False,site=site,workers=workers)
 
-  print(f'@ {ctime()} Updating teacher enrollments')
-  term.update_enrollments(students=False)
+    print(f'@ {ctime()} Updating teacher enrollments')
+    term.update_enrollments(students=False,site=site,workers=workers)
 
   print(f'Finished enrollments at {ctime()}')
 
-def db_update_period_records(site = None,*,period = None,midterm = False, cumulative = False, final = False, comments = True, course_id_limit = '2020'):
+@sync_step
+def db_update_period_records(site = None,*,period = None,midterm = False, cumulative = False, final = False, comments = True, course_id_limit = '2020', workers = None, client = 'sync', incremental = False):
+  # incremental=True only pulls grades for courses with something graded since their last pull (not for client='report')
+  # deleted assignments and weight or grading standard changes aren't grading events: run a full pull after those
   
   if not site:
     site = canvas_site()
@@ -150,24 +205,42 @@ def db_update_period_records(site = None,*,period = None,midterm = False, cumula
     periods = site.get_cumulative_periods(period=period)
   else:
     periods = [period]
+
+  # the async client's http session and db writer are shared by every period's pull and closed at the end
+  with (canvas_site_async(site) if client == 'async' else nullcontext()) as canvas_async:
+    if client == 'report':
+      term = periods[0].get_term()
+      print(f'@ {ctime()} Updating {term.term_name} grade records from the grade export report')
+      site.update_grade_report(term=term,periods=periods,midterm=midterm,final=final,id_limit=course_id_limit)
   
-  for period in periods:    
-    print(f'Starting at {ctime()} Set the comment field name to default')
-    period.set_comment_field(midterm)
+    for period in periods:    
+      print(f'Starting at {ctime()} Set the comment field name to default')
+      period.set_comment_field(midterm)
     
-    print(f'@ {ctime()} Updating attendance')
-    period.update_attendance()
+      print(f'@ {ctime()} Updating attendance')
+      period.update_attendance()
     
     
-    print(f'@ {ctime()} Updating {period.period_name} grade records and comments')
-    period.update_grade_records(comments=comments,id_limit = course_id_limit)
+      print(f'@ {ctime()} Updating {period.period_name} grade records and comments')
+      if client == 'async':
+        canvas_async.run(canvas_async.update_grade_records, period, comments=comments, incremental=incremental, id_limit=course_id_limit)
+      elif client == 'report':
+        # grades came from the report; comments are still per course
+        if comments:
+          period.update_grade_records(midterm=midterm,comments=comments,grades=False,id_limit = course_id_limit,site=site,workers=workers)
+      else:
+        period.update_grade_records(comments=comments,incremental=incremental,id_limit = course_id_limit,site=site,workers=workers)
   
-  if final:
-    term = canvas_site().get_current_term()
-    print(f'@ {ctime()} Updating {term.term_name} grade records')
-    term.update_grade_records()
-    print(f'Finished with {term.term_name} grades at {ctime()}')
-
+    if final and client != 'report':
+      term = site.get_current_term()
+      print(f'@ {ctime()} Updating {term.term_name} grade records')
+      if client == 'async':
+        canvas_async.run(canvas_async.update_term_grade_records, term, incremental=incremental)
+      else:
+        term.update_grade_records(site=site,workers=workers,incremental=incremental)
+      print(f'Finished with {term.term_name} grades at {ctime()}')
+
+@sync_step
 def db_full_update(site=None,*,comments = True, crm = None, crm_lookup = True):
   if not site:
     site = canvas_site()
@@ -177,7 +250,9 @@ def db_full_update(site=None,*,comments = True, crm = None, crm_lookup = True):
   
   # all terms ?!?
   session = Session()
-  terms = session.query(Term).filter(Term.gp_group_id.isnot(None)).all()
+  # archived terms are closed, so there's nothing to pull for them
+  terms = session.query(Term).filter(Term.gp_group_id.isnot(None))\
+    .filter(Term.term_id.notin_(select(Archived_Term.term_id))).all()
   for term in terms:
     db_update_courses(site=site,term=term)
     db_update_enrollments(site=site,term=term)
@@ -1,7 +1,6 @@
 # Module parent_email.py
 
-from model import Student, Parent, Teacher, Term, GP_Group, Grading_Period, Course, Section, Grade_Record, Attendance, canvas_site, Session, crm_site
-from time import sleep
+from model import Student, Parent, Teacher, Term, GP_Group, Grading_Period, Course, Section, Grade_Record, Attendance, canvas_site, Session, crm_site, retry_policy
 # sending emails
 import smtplib
 from email.message import EmailMessage
@@ -16,6 +15,9 @@ recipient = "A Parent <parent@smtp.mailtrap.io>"
 session = Session()
 parents = session.query(Parent).filter(Parent.active == True).filter_by(last_name = 'Shinabery').all()
 
+# mail server hiccups back off the same way api calls do
+retry = retry_policy()
+
 # loop through parents and send emails
 # skip = True
 skip = False
@@ -60,21 +62,17 @@ Canvas: http://canvas.example.com\n'''
     # if email doesn't have any student info (kids are too young), skip it
     if not stu_count:
         continue
-    count = 0
-    while True:
-        try:
-            # with smtplib.SMTP("smtp-relay.gmail.com", 25) as server:
-            with smtplib.SMTP("smtp.mailtrap.io", 2525) as server:
-                server.login("bd2529fbceb904", "385b2662956e62")
-                server.send_message(msg)
-                print(f'Email sent to parent {parent.crm_id}')
-                # sleep(2)
-                break
-        except Exception as e:
-            print(e)
-            count += 1
-            print(f'Problem with parent {parent.crm_id}')
-            sleep(60*count)
+    def send():
+        # with smtplib.SMTP("smtp-relay.gmail.com", 25) as server:
+        with smtplib.SMTP("smtp.mailtrap.io", 2525) as server:
+            server.login("bd2529fbceb904", "385b2662956e62")
+            server.send_message(msg)
+    try:
+        retry.run(send, label = f'Email to parent {parent.crm_id}')
+        print(f'Email sent to parent {parent.crm_id}')
+    except Exception as e:
+        print(e)
+        print(f'Problem with parent {parent.crm_id}')
 
         
         
\ No newline at end of file
@@ -0,0 +1,79 @@
+# Module report_standin.py
+# serves canvas account reports from a local folder so canvas_site.update_rosters can be tried without canvas
+# put users.csv, courses.csv, sections.csv and enrollments.csv (as exported by the provisioning report) in a folder, then
+#   python scripts/report_standin.py path/to/folder 8000
+# and set canvas_host = http://localhost:8000 in .env
+# a csv named after a report (mgp_grade_export_csv.csv for canvas_site.update_grade_report) is served on its own,
+# the way canvas sends single file reports; e.g. a grade export with only some periods' columns shows that
+# update_grade_report replaces just those periods
+
+import io, json, sys, zipfile
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+folder = Path(sys.argv[1] if len(sys.argv) > 1 else '.')
+port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+
+# report id -> [number of status checks before it's ready, report name]; pretend canvas needs a moment
+reports = {}
+
+class report_handler(BaseHTTPRequestHandler):
+
+  def send_json(self, data, status = 200):
+    body = json.dumps(data).encode()
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_POST(self):
+    # POST /api/v1/accounts/:id/reports/:report starts a report
+    parts = self.path.split('?')[0].strip('/').split('/')
+    if parts[-2] != 'reports':
+      return self.send_json({'message':'not found'}, 404)
+    report_id = len(reports) + 1
+    reports[report_id] = [2, parts[-1]]
+    self.send_json({'id':report_id, 'report':parts[-1], 'status':'created'})
+
+  def do_GET(self):
+    path = self.path.split('?')[0]
+    parts = path.strip('/').split('/')
+    # GET /files/<report>.csv downloads a single file report
+    if path.startswith('/files/') and path.endswith('.csv') and (folder / parts[-1]).exists():
+      body = (folder / parts[-1]).read_bytes()
+      self.send_response(200)
+      self.send_header('Content-Type', 'text/csv')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+      return
+    # GET /files/report.zip downloads every csv in the folder
+    if path == '/files/report.zip':
+      buffer = io.BytesIO()
+      with zipfile.ZipFile(buffer, 'w') as archive:
+        for csv_file in sorted(folder.glob('*.csv')):
+          archive.write(csv_file, csv_file.name)
+      body = buffer.getvalue()
+      self.send_response(200)
+      self.send_header('Content-Type', 'application/zip')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+      return
+    # GET /api/v1/accounts/:id/reports/:report/:report_id checks on a report
+    if len(parts) < 3 or parts[-3] != 'reports' or int(parts[-1]) not in reports:
+      return self.send_json({'message':'not found'}, 404)
+    report_id = int(parts[-1])
+    reports[report_id][0] -= 1
+    if reports[report_id][0] > 0:
+      return self.send_json({'id':report_id, 'status':'running', 'progress':50})
+    filename = f'{reports[report_id][1]}.csv'
+    if not (folder / filename).exists():
+      filename = 'report.zip'
+    self.send_json({'id':report_id, 'status':'complete', 'progress':100,
+                    'attachment':{'filename':filename, 'url':f'http://localhost:{port}/files/{filename}'}})
+
+if __name__ == '__main__':
+  print(f'Serving reports from {folder.resolve()} on port {port}')
+  ThreadingHTTPServer(('localhost', port), report_handler).serve_forever()
@@ -5,11 +5,12 @@ import views # new report classes
 
 from time import ctime # for keeping track of times
 from decimal import Decimal, localcontext, ROUND_DOWN # use to truncate grades predictably
-from model import Student, Parent, Teacher, Term, GP_Group, Grading_Period, Course, Section, Grade_Record, Attendance, canvas_site, Session, crm_site
+from model import Student, Parent, Teacher, Term, GP_Group, Grading_Period, Course, Section, Grade_Record, Attendance, canvas_site, Session, crm_site, migrate
 
 
 def create_db(*,crm_lookup = False):
   # starts a new db from scratch or adds new term info to an existing one
+  migrate()
   site = canvas_site()
   term = site.get_current_term()
   
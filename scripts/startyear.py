@@ -39,7 +39,7 @@ def api_remove_observers(site = None):
   
   # get list of all observer ids
   url = site.baseUrl + f'accounts/{getenv("root_account")}/users?enrollment_type=observer&per_page=80'
-  api_response = requests.get(url, headers=site.header, timeout=20)
+  api_response = site.get(url, timeout=20)
   api_response.raise_for_status()  # exception if api call fails
   observer_ids = []
   while len(api_response.json()):
@@ -50,28 +50,24 @@ def api_remove_observers(site = None):
     # go to the next link if there is one; break if there isn't or it's empty
     # should have multiple pages--too many for a 'last' link
     if api_response.links.get('next', 0):
-      api_response = requests.get(
-        api_response.links['next']['url'], headers=site.header, timeout=20)
+      api_response = site.get(api_response.links['next']['url'], timeout=20)
     else:
       break
   # go through the id list and delete? all of the users
 
+  # the site retries failed deletes on its own
   for observer in observer_ids:
     url = site.baseUrl + f'accounts/{getenv("root_account")}/users/{observer}'
-    attempts = 0
-    while attempts < 3:
-      try:
-        api_response = requests.delete(url, headers=site.header, timeout=30)
-        api_response.raise_for_status()  # exception if api call fails
-        break
-      except:
-        attempts += 1
-        print(f'Retrying user deletion for id {observer}')
+    try:
+      api_response = site.delete(url, timeout=30)
+      api_response.raise_for_status()  # exception if api call fails
+    except:
+      print(f'Unable to delete user id {observer}')
 
 
 def get_parent_id(site,parent):
   url = site.baseUrl + f'accounts/{getenv("root_account")}/users?search_term={parent.email}'
-  api_response = requests.get(url, headers=site.header, timeout=30)
+  api_response = site.get(url, timeout=30)
   try:
     parent_id = api_response.json()[0]['id']
   except:
@@ -90,39 +86,34 @@ def api_create_observers(site = None):
   # Let's start with parents in the db first:
 
   parents = session.query(Parent).all() # easy to filter down to only current ones?
+  # the site retries timeouts and server errors itself; creating a user is a POST, so it is only
+  # resent when the connection failed before the request went out
   for parent in parents:
-    attempts = 0
-    while attempts <3:
-      try:
-        # first find parent?
-        parent_id = get_parent_id(site, parent)
-        # if no parent in canvas, create one and grab the id
-        if not parent_id:
-          parent_name = parent.last_name + ', ' + parent.first_name
-          url = site.baseUrl + f'accounts/{getenv("root_account")}/users?user[sortable_name]={parent_name}&pseudonym[unique_id]={parent.email}&user[skip_registration]=true'
-          api_response = requests.post(url, headers=site.header, timeout=30)
-          api_response.raise_for_status()  # exception if api call fails
-          parent_id = api_response.json()['id']
-        # Get all students to add
-        print(f'Starting parent id {parent_id}')
-        for student in parent.students:
-          if student.active:
-            # add all active students to parents - only active students should have parents, but check anyways
-            st_attempts = 0
-            while st_attempts <3:
-              try:
-                url2= site.baseUrl + f'users/{parent_id}/observees/{student.canvas_id}'
-                api_response2 = requests.put(url2, headers=site.header, timeout=30)
-                api_response2.raise_for_status()  # exception if api call fails
-                break
-              except:
-                print(f'Problem with adding student {student.last_name}, {student.first_name} to parent id {parent_id}')
-                st_attempts +=1
-        print(f'Finished with parent {parent.last_name}, {parent.first_name}')
-        break
-      except:
-        print(f'Problem with parent {parent.last_name}, {parent.first_name}')
-        attempts +=1
+    try:
+      # first find parent?
+      parent_id = get_parent_id(site, parent)
+      # if no parent in canvas, create one and grab the id
+      if not parent_id:
+        parent_name = parent.last_name + ', ' + parent.first_name
+        url = site.baseUrl + f'accounts/{getenv("root_account")}/users?user[sortable_name]={parent_name}&pseudonym[unique_id]={parent.email}&user[skip_registration]=true'
+        api_response = site.post(url, timeout=30)
+        api_response.raise_for_status()  # exception if api call fails
+        parent_id = api_response.json()['id']
+    except:
+      print(f'Problem with parent {parent.last_name}, {parent.first_name}')
+      continue
+    # Get all students to add
+    print(f'Starting parent id {parent_id}')
+    for student in parent.students:
+      if student.active:
+        # add all active students to parents - only active students should have parents, but check anyways
+        try:
+          url2= site.baseUrl + f'users/{parent_id}/observees/{student.canvas_id}'
+          api_response2 = site.put(url2, timeout=30)
+          api_response2.raise_for_status()  # exception if api call fails
+        except:
+          print(f'Problem with adding student {student.last_name}, {student.first_name} to parent id {parent_id}')
+    print(f'Finished with parent {parent.last_name}, {parent.first_name}')
 
 def api_course_publish(site,course,grade_scale_id = None,home_page='feed', course_status = 'offer'):
   if not site:
@@ -137,7 +128,7 @@ def api_course_publish(site,course,grade_scale_id = None,home_page='feed', cours
           + f'&course[event]={course_status}' \
           + f'&course[hide_distribution_graphs]=true'
   try:
-    api_response = requests.put(url, headers=site.header, timeout=20)
+    api_response = site.put(url, timeout=20)
     api_response.raise_for_status()  # exception if api call fails
   except:
     print(f'Unable to update course {course.sis_id}')
@@ -165,7 +156,7 @@ def get_canvas_parent(site,email):
   
   # Query canvas for a user with the given email
   url = site.baseUrl + f'accounts/{getenv("root_account")}/users?search_term={email}'
-  api_response = requests.get(url, headers=site.header, timeout=30)
+  api_response = site.get(url, timeout=30)
   try:
     parent_id = api_response.json()[0]['id']
     return parent_id
@@ -177,7 +168,7 @@ def get_canvas_parent(site,email):
       parent = session.query(Parent).filter_by(email=email).one()
       parent_name = parent.last_name + ', ' + parent.first_name
       url = site.baseUrl + f'accounts/{getenv("root_account")}/users?user[sortable_name]={parent_name}&pseudonym[unique_id]={parent.email}&user[skip_registration]=true'
-      api_response = requests.post(url, headers=site.header, timeout=30)
+      api_response = site.post(url, timeout=30)
       api_response.raise_for_status()  # exception if api call fails
       parent_id = api_response.json()['id']
       return parent_id
@@ -190,32 +181,24 @@ def remove_observee(student_canvas_id,parent_email,site = None):
     site=canvas_site()
 
   parent_id=get_canvas_parent(site,parent_email)
-  st_attempts = 0
-  while st_attempts <3:
-    try:
-      url2= site.baseUrl + f'users/{parent_id}/observees/{student_canvas_id}'
-      api_response2 = requests.delete(url2, headers=site.header, timeout=30)
-      api_response2.raise_for_status()  # exception if api call fails
-      break
-    except:
-      print(f'Problem with adding student to parent.')
-      st_attempts +=1
+  try:
+    url2= site.baseUrl + f'users/{parent_id}/observees/{student_canvas_id}'
+    api_response2 = site.delete(url2, timeout=30)
+    api_response2.raise_for_status()  # exception if api call fails
+  except:
+    print(f'Problem with adding student to parent.')
 
 def add_observee(student_canvas_id,parent_email, site = None):
   if not site:
     site=canvas_site()
 
   parent_id=get_canvas_parent(site,parent_email)
-  st_attempts = 0
-  while st_attempts <3:
-    try:
-      url2= site.baseUrl + f'users/{parent_id}/observees/{student_canvas_id}'
-      api_response2 = requests.put(url2, headers=site.header, timeout=30)
-      api_response2.raise_for_status()  # exception if api call fails
-      break
-    except:
-      print(f'Problem with adding student to parent.')
-      st_attempts +=1
+  try:
+    url2= site.baseUrl + f'users/{parent_id}/observees/{student_canvas_id}'
+    api_response2 = site.put(url2, timeout=30)
+    api_response2.raise_for_status()  # exception if api call fails
+  except:
+    print(f'Problem with adding student to parent.')
 
 
 
@@ -234,7 +217,7 @@ def api_courses_stats(site = None,display_stats=False):
     url = site.baseUrl + f'courses/{course.canvas_id}/settings?' \
           + f'hide_distribution_graphs={hdg}'
     try:
-      api_response = requests.put(url, headers=site.header, timeout=20)
+      api_response = site.put(url, timeout=20)
       api_response.raise_for_status()  # exception if api call fails
     except:
       print(f'Unable to update stats {course.sis_id}')
\ No newline at end of file
@@ -11,7 +11,8 @@ import os # managing files and directories
 import pandas # fun data manipulation and import/export
 from time import ctime  # for keeping track of times
 from decimal import Decimal, localcontext, ROUND_DOWN  # use to truncate grades predictably
-from model import Student, Parent, Teacher, Term, GP_Group, Grading_Period, Course, Section, Grade_Record, Attendance, canvas_site, Session, crm_site
+from model import Student, Parent, Teacher, Term, GP_Group, Grading_Period, Course, Section, Grade_Record, Attendance, canvas_site, Session, crm_site, sync_context, context_session, \
+  student_sections, term_rows
 from sqlalchemy import func, literal, cast, Integer, Unicode
 
 
@@ -99,81 +100,83 @@ def rebuild_html(file = None):
 
 def cs_individual_reports(final = False):
   # creates individual pdf for each active cs student
-  session = Session()
-  s = session.query(Student).filter(Student.sis_id.startswith('C'))\
-                            .filter_by(active = True).all()
-  p = canvas_site().get_current_period()
+  with sync_context() as context:
+    s = context.session.query(Student).filter(Student.sis_id.startswith('C'))\
+                              .filter_by(active = True).all()
+    p = context.attach(context.canvas.get_current_period())
 
-  for student in s:
-    rc=cs_report_card(student,p,final = final)
-    rc.pdf()
+    for student in s:
+      rc=cs_report_card(student,p,final = final,context = context)
+      rc.pdf()
 
 def School_individual_reports(final = False):
   # creates individual pdf for each active School student
-  session = Session()
-  s = session.query(Student).filter(Student.sis_id.startswith('s1'))\
-                            .filter_by(active = True)\
-                            .filter(Student.grade >= 3)\
-                            .filter(Student.grade <= 12).all()
-  p = canvas_site().get_current_period()
-
-  for student in s:
-    if student.grade <= 6:
-      rc=ls_report_card(student,p,final = final)
-    else:
-      rc=us_report_card(student,p, final = final)
-    rc.pdf()
+  with sync_context() as context:
+    s = context.session.query(Student).filter(Student.sis_id.startswith('s1'))\
+                              .filter_by(active = True)\
+                              .filter(Student.grade >= 3)\
+                              .filter(Student.grade <= 12).all()
+    p = context.attach(context.canvas.get_current_period())
+
+    for student in s:
+      if student.grade <= 6:
+        rc=ls_report_card(student,p,final = final,context = context)
+      else:
+        rc=us_report_card(student,p, final = final,context = context)
+      rc.pdf()
 
 def trimester_report_cards(final = False):
-  session = Session()
-
-  students = session.query(Student)\
-                .filter_by(active = True)\
-                .filter(Student.sis_id.startswith('s1'))\
-                .filter(Student.grade >= 3)\
-                .filter(Student.grade <= 12)\
-                .order_by(Student.last_name).all()
-  period = canvas_site().get_current_period()
-  
   # Start with empty report batch
   batch = report_batch(css='progressreport.css', title ='School Trimester Report Cards')
+
+  # one session and canvas site for every report card in the batch
+  with sync_context() as context:
+    students = context.session.query(Student)\
+                  .filter_by(active = True)\
+                  .filter(Student.sis_id.startswith('s1'))\
+                  .filter(Student.grade >= 3)\
+                  .filter(Student.grade <= 12)\
+                  .order_by(Student.last_name).all()
+    period = context.attach(context.canvas.get_current_period())
   
-  # add report for each student
-  for student in students:
-    # catch LS
-    if student.grade < 7:
-      batch.add_report(ls_report_card(student,period, final = final).pyhtml())
-    else:
-      batch.add_report(us_report_card(student,period, final = final).pyhtml())
+    # add report for each student
+    for student in students:
+      # catch LS
+      if student.grade < 7:
+        batch.add_report(ls_report_card(student,period, final = final, context = context).pyhtml())
+      else:
+        batch.add_report(us_report_card(student,period, final = final, context = context).pyhtml())
   
   # output
   batch.pdf()
 
 
 def cs_report_cards(final = False):
-  session = Session()
-
-  students = session.query(Student)\
-                .filter(Student.sis_id.startswith('C'))\
-                .order_by(Student.last_name).all()
-  period = canvas_site().get_current_period()
-  
   # Start with empty report batch
   batch = report_batch(css='progressreport.css',title = 'CS Report Cards')
+
+  # one session and canvas site for every report card in the batch
+  with sync_context() as context:
+    students = context.session.query(Student)\
+                  .filter(Student.sis_id.startswith('C'))\
+                  .order_by(Student.last_name).all()
+    period = context.attach(context.canvas.get_current_period())
   
-  # add report for each student
-  for student in students:
-    batch.add_report(cs_report_card(student,period, final = final).pyhtml())
+    # add report for each student
+    for student in students:
+      batch.add_report(cs_report_card(student,period, final = final, context = context).pyhtml())
   
   # output
   batch.pdf(name = "CS_Report_Cards")
 class grade_rec: # grade record for inclusion on a report
   # base class grade reports
   # must have student, course, period(s)
-  def __init__(self,student,course,*,period = None, final = False, midterm = False):
+  def __init__(self,student,course,*,period = None, final = False, midterm = False, context = None):
+    # context (a sync_context) shares one session and canvas site across all of the records in a run
+    self.context = context
     # if period is given, update the class variable
     if period:
-      self.set_periods(period)
+      self.set_periods(period, site = context.canvas if context else None, context = context)
     self.set_student(student)
     self.set_course(course)
     # self.periods = grade_rec.periods
@@ -183,13 +186,15 @@ class grade_rec: # grade record for inclusion on a report
   # quite what will happen when this is part of a larger program, I'm uncertain
   # I'm also unsure quite how this works with inheritance
   @classmethod
-  def set_periods(cls,period,*,cumulative = True):
+  def set_periods(cls,period,*,cumulative = True,site = None,context = None):
     # sets list of periods for all grade_rec instances
     cls.periods = []
     if not cumulative:
       cls.periods = [period]
     else:
-      cls.periods = canvas_site().get_cumulative_periods(period = period)
+      if not site:
+        site = canvas_site()
+      cls.periods = site.get_cumulative_periods(period = period, context = context)
 
   def set_student(self,student):
     self.student = student
@@ -201,24 +206,25 @@ class grade_rec: # grade record for inclusion on a report
     # Go through each period (term if final) and grab letter, %'s, and comments for the course/student
     # create a nested dict with gp_name as first key
     # grade, score, comment are nested keys
-    session = Session()
-    student = session.merge(self.student)
-    course = session.merge(self.course)
+    session, student = context_session(self.student, self.context)
+    course = self.context.attach(self.course) if self.context else session.merge(self.course)
     self.records = {}
+    # an archived term's records are read from the archive
+    records = term_rows(Grade_Record, course.term, session)
     
     for period in self.periods:
-      rec = session.query(Grade_Record).filter_by(student_id = student.sis_id) \
-        .filter_by(period_id = period.period_id) \
-        .filter_by(course_id = course.sis_id) \
-        .filter_by(midterm = midterm).one_or_none()
+      rec = session.query(records).filter(records.student_id == student.sis_id) \
+        .filter(records.period_id == period.period_id) \
+        .filter(records.course_id == course.sis_id) \
+        .filter(records.midterm == midterm).one_or_none()
       if not rec:
         self.records[period.period_id]={'grade':None,'score':None,'comment':None}
       else:
         self.records[period.period_id]={'grade':rec.grade,'score':rec.score,'comment':rec.comment}
     if final:
-      rec = session.query(Grade_Record).filter_by(student_id = student.sis_id) \
-        .filter_by(term_id = period.get_term().term_id) \
-        .filter_by(course_id = course.sis_id) \
+      rec = session.query(records).filter(records.student_id == student.sis_id) \
+        .filter(records.term_id == period.get_term(context = self.context).term_id) \
+        .filter(records.course_id == course.sis_id) \
         .one_or_none()
       if not rec:
         self.records['final']={'grade':None,'score':None}
@@ -231,8 +237,7 @@ class grade_rec: # grade record for inclusion on a report
   
   def teacher_name(self):
     # join together the list of teacher names
-    session = Session()
-    course = session.merge(self.course)
+    session, course = context_session(self.course, self.context)
     try:
       teachers = []
       for i in range(len(course.teachers)):
@@ -278,8 +283,7 @@ class ls_grade_rec(grade_rec):
 
     # set the order and rename things
     # need a session to grab teacher info:
-    session = Session()
-    course = session.merge(self.course)
+    session, course = context_session(self.course, self.context)
 
     # LS reports don't use teacher for most courses, but if there is a teacher different from the homeroom teach,
     # teach should be added to the course name
@@ -308,7 +312,7 @@ class ls_grade_rec(grade_rec):
         print(f'Course {self.course_name} is missing from rename dict')
 
     # now add in the teacher name if applicable    
-    hteacher = student.get_homeroom_teacher()
+    hteacher = student.get_homeroom_teacher(context = self.context)
     
     for teacher in course.teachers:
       if not teacher.sis_id == hteacher.sis_id:
@@ -387,19 +391,24 @@ class report_card(report):
 
   # Heading/Header: image, name, grade
   # 
-  def __init__(self,student,period,*,cumulative = True,final = False):
+  def __init__(self,student,period,*,cumulative = True,final = False,context = None):
+    # context (a sync_context) shares one session and canvas site across a batch of report cards
+    self.context = context
     self.student = student
     self.set_periods(period,cumulative = cumulative)
     # self.cumulative = cumulative # I don't think this needs to exist independently of periods
     self.final = final
     self.grade_recs = []
     
-    session = Session()
-    student = session.merge(student)
-    self.term = period.get_term()
+    session, student = context_session(student, context)
+    self.term = period.get_term(context = context)
     self.set_attendance(final = final)
-    # get all active courses for a student
-    self.courses = [section.course for section in student.sections if section.course.term.term_id == self.term.term_id]
+    # get all active courses for a student (an archived term's enrollments are in the archive)
+    enrolled = term_rows(student_sections, self.term, session)
+    self.courses = [section.course for section in session.query(Section)
+                    .join(enrolled, enrolled.c.section_id == Section.section_id)
+                    .filter(enrolled.c.student_id == student.sis_id).order_by(Section.course_id)
+                    if section.course.term.term_id == self.term.term_id]
   
   def set_periods(self,period,*,cumulative = True,sort = True):
     # sets list of periods for all grade_rec instances
@@ -407,8 +416,7 @@ class report_card(report):
     if not cumulative:
       self.periods = [period]
     else:
-      session = Session()
-      session.merge(period)
+      session, period = context_session(period, self.context)
       for p in session.query(Grading_Period) \
           .filter_by(gp_group_id = period.gp_group_id):
         
@@ -421,14 +429,14 @@ class report_card(report):
     # pulls attendance records for each period and sticks them into a dict
     #  period_id is the primary key for a list [A,T]
 
-    session = Session()
-    student = session.merge(self.student)
+    session, student = context_session(self.student, self.context)
     self.attendance = {}
     atotal = Decimal(0.0)
     ttotal = 0
+    attendance = term_rows(Attendance, self.term, session)
     for period in self.periods:
       # get the record for student,period
-      a_rec = session.query(Attendance).filter_by(student_id = self.student.sis_id).filter_by(period_id = period.period_id).one_or_none()
+      a_rec = session.query(attendance).filter(attendance.student_id == self.student.sis_id).filter(attendance.period_id == period.period_id).one_or_none()
       # if it doesn't exist use 0's
       if not a_rec:
         self.attendance[period.period_id]=['0','0']
@@ -445,8 +453,7 @@ class report_card(report):
     # makes a pyhtml table element containing attendance for the given student/period
     
     # start a session and pull in student info
-    session = Session()
-    student = session.merge(self.student)
+    session, student = context_session(self.student, self.context)
     
     a_row = pyhtml.tr(
       pyhtml.td(class_ = "attendance")('Attendance'),
@@ -494,12 +501,11 @@ class report_card(report):
     if not css:
       css='progressreport.css'
 
-    session = Session()
-    student = session.merge(self.student)
-    period = session.merge(self.periods[-1])
+    session, student = context_session(self.student, self.context)
+    period = self.context.attach(self.periods[-1]) if self.context else session.merge(self.periods[-1])
 
     name = f'{student.last_name} {student.common_name}'
-    dirName = f'generated_docs/{period.get_term().term_name}/{period.period_name}'
+    dirName = f'generated_docs/{period.get_term(context = self.context).term_name}/{period.period_name}'
     title = f'{student.common_name} {student.last_name} {period.period_name} Report Card'
 
     if not os.path.exists(dirName):
@@ -542,12 +548,12 @@ class report_card(report):
       print(e)
 
 class us_report_card(report_card):
-  def __init__(self,student,period,*,final = False):
-    report_card.__init__(self,student,period,cumulative = True,final = final)
+  def __init__(self,student,period,*,final = False,context = None):
+    report_card.__init__(self,student,period,cumulative = True,final = final,context = context)
 
     # grade_rec period should already be set from within the report_batch
 
-    self.grade_recs = [us_grade_rec(self.student,course,period = period,final = self.final) for course in self.courses]
+    self.grade_recs = [us_grade_rec(self.student,course,period = period,final = self.final,context = context) for course in self.courses]
   
   def pyhtml(self):
     # returns a pyhtml div with student heading, grade records, and attendance
@@ -602,12 +608,12 @@ class us_report_card(report_card):
     return pyhtml.div(class_=self.__class__.__name__)(elements)
 
 class ls_report_card(report_card):
-  def __init__(self,student,period,*,final = False):
-    report_card.__init__(self,student,period,cumulative = True,final = final)
+  def __init__(self,student,period,*,final = False,context = None):
+    report_card.__init__(self,student,period,cumulative = True,final = final,context = context)
 
     # grade_rec period should already be set from within the report_batch
 
-    self.grade_recs = [ls_grade_rec(self.student,course,period = period,final = self.final) for course in self.courses]
+    self.grade_recs = [ls_grade_rec(self.student,course,period = period,final = self.final,context = context) for course in self.courses]
 
     # get spgc
     spgcs = []
@@ -626,7 +632,7 @@ class ls_report_card(report_card):
     self.grade_recs.sort(key=lambda rec: rec.order)
 
     # get homeroom teacher
-    self.homeroom_teacher=student.get_homeroom_teacher()
+    self.homeroom_teacher=student.get_homeroom_teacher(context = context)
   
   def pyhtml(self):
     # returns a pyhtml div with student heading, grade records, and attendance
@@ -698,12 +704,12 @@ class ls_report_card(report_card):
     return pyhtml.div(class_=self.__class__.__name__)(elements)
 
 class cs_report_card(report_card):
-  def __init__(self,student,period,*,final = False):
-    report_card.__init__(self,student,period,cumulative = True,final = final)
+  def __init__(self,student,period,*,final = False,context = None):
+    report_card.__init__(self,student,period,cumulative = True,final = final,context = context)
 
     # grade_rec period should already be set from within the report_batch
 
-    self.grade_recs = [grade_rec(self.student,course,period = period,final = self.final) for course in self.courses]
+    self.grade_recs = [grade_rec(self.student,course,period = period,final = self.final,context = context) for course in self.courses]
   
   def pyhtml(self):
     # returns a pyhtml div with student heading, grade records, and attendance